@@ -0,0 +1,20 @@
+"""
+Kernels
+=======
+
+Numba kernels, imported by :py:mod:`polyflame.fhirflat` only when needed,
+as importing numba is slow
+"""
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True, parallel=True)
+def bin_ages(ages: np.ndarray, edges: np.ndarray, out: np.ndarray) -> None:
+    # Bins are closed on the right as in pd.cut(), ages outside the
+    # bins or missing get code -1
+    n_bins = edges.size - 1
+    for i in numba.prange(ages.size):
+        k = np.searchsorted(edges, ages[i], side="left") - 1
+        out[i] = k if 0 <= k < n_bins else -1
@@ -4,7 +4,12 @@ FHIRflat adapter for PolyFLAME
 Reads in FHIRflat files and provides commonly used analysis functions
 """
 
+import functools
+import importlib.util
+import itertools
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Final, Sequence
 
@@ -15,19 +20,119 @@ else:
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pa_ds
 
 from .types import DataPlotInfo, SourceInfo, Taxonomy
-from .util import get_checksum, load_taxonomy, msg_part_not_found, with_readable_terms
+from .util import (
+    LRUCache,
+    get_checksum,
+    load_taxonomy,
+    msg_part_not_found,
+    read_checksums,
+    with_readable_terms,
+)
 
 METADATA_FILE: Final[str] = "fhirflat.toml"
+PARALLEL_IO_ENV: Final[str] = "POLYFLAME_PARALLEL_IO"
 
-DEFAULT_TAXONOMY = load_taxonomy("fhirflat-isaric3")
-DEFAULT_AGE_BINS = [-1, *list(5 * np.arange(25))]  # highest age of 120
+DEFAULT_TAXONOMY_NAME: Final[str] = "fhirflat-isaric3"
+# highest age of 120, read-only as it is used as a default argument
+DEFAULT_AGE_BINS: Final[np.ndarray] = np.concatenate(([-1], 5 * np.arange(25))).astype(np.int16)
+DEFAULT_AGE_BINS.flags.writeable = False
+
+
+@functools.cache
+def _default_taxonomy() -> Taxonomy:
+    "Default taxonomy, loaded on first use instead of at import"
+    return load_taxonomy(DEFAULT_TAXONOMY_NAME)
+
+
+def __getattr__(name: str):
+    # DEFAULT_TAXONOMY is kept as a lazily loaded module attribute
+    if name == "DEFAULT_TAXONOMY":
+        return _default_taxonomy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def age_group_labels(age_bins: Sequence[int] | np.ndarray) -> list[str]:
+    "Labels for the age groups formed by consecutive `age_bins` edges"
+    return [f"{left + 1} - {right}" for left, right in itertools.pairwise(age_bins)]
+
+
+DEFAULT_AGE_GROUP_LABELS = age_group_labels(DEFAULT_AGE_BINS)
+
+# Minimum number of rows for which age groups are computed with numba,
+# below this pd.cut() is fast enough that JIT dispatch is not worth it
+NUMBA_MIN_ROWS: Final[int] = 100_000
+
+# numba is optional and only imported when the kernel is first used
+_HAS_NUMBA: Final[bool] = importlib.util.find_spec("numba") is not None
+
+
+def age_groups(
+    age: pd.Series, age_bins: Sequence[int] | np.ndarray, labels: list[str]
+) -> pd.Series | pd.Categorical:
+    """Assigns ages to age groups formed by `age_bins`, with `labels`
+
+    Integer bins that have the same width after the first one, such as
+    :py:data:`DEFAULT_AGE_BINS`, are assigned arithmetically. Other bins use
+    a numba kernel for large data if numba is installed, otherwise
+    :py:func:`pandas.cut`
+    """
+    edges = np.asarray(age_bins)
+    widths = np.diff(edges)
+    if (
+        edges.dtype.kind in "iu"
+        and len(widths) > 1
+        and widths[0] > 0
+        and (widths[1:] == widths[1]).all()
+        and widths[1] > 0
+    ):
+        # Bin k >= 1 is (edges[1] + (k - 1) * width, edges[1] + k * width], so
+        # its index is the ceiling of the distance from edges[1] in widths
+        ages = age.to_numpy(np.float64)
+        with np.errstate(invalid="ignore"):
+            codes = np.maximum(np.ceil((ages - edges[1]) / widths[1]), 0)
+            codes[~((ages > edges[0]) & (ages <= edges[-1]))] = -1  # also NaN
+        return pd.Categorical.from_codes(codes.astype(np.int16), categories=labels, ordered=True)
+    if _HAS_NUMBA and len(age) >= NUMBA_MIN_ROWS:
+        # the kernel does not validate bins, unlike pd.cut()
+        if not (widths > 0).all():
+            raise ValueError("bins must increase monotonically.")
+        from ._kernels import bin_ages
+
+        codes = np.empty(len(age), dtype=np.int16)
+        bin_ages(age.to_numpy(np.float64), edges.astype(np.float64), codes)
+        return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+    return pd.cut(age, bins=age_bins, labels=labels)
+
+
+# http://unitsofmeasure.org|a represents years
+AGE_UNITS_YEARS: Final[list[str]] = ["http://unitsofmeasure.org|a", "https://unitsofmeasure.org|a"]
+
+# Plain string columns are kept in Arrow memory instead of being converted to
+# Python objects. Other columns, notably the list<string> code columns, use
+# the default conversion, as lookups index into their lists.
+_ARROW_TYPES: Final[dict[pa.DataType, pd.api.extensions.ExtensionDtype]] = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+
+CONDITION_CACHE_SIZE: Final[int] = 8
+
+# Least recently used cache of read_condition() results, keyed on source path,
+# checksum and taxonomy identity; values hold the taxonomy to guard against id reuse
+_CONDITION_CACHE: LRUCache[tuple[str, str, int], tuple[Taxonomy, pd.DataFrame]] = LRUCache(
+    CONDITION_CACHE_SIZE
+)
 
 
 def read_metadata(file: Path) -> SourceInfo:
     "Read FHIRflat metadata file"
-    metadata = tomllib.loads(file.read_text())["metadata"]
+    with file.open("rb") as fp:
+        metadata = tomllib.load(fp)["metadata"]
     N = metadata.get("N")
     return {
         "N": N,
@@ -51,7 +156,8 @@ def use_source(folder: str | Path, checksum: str) -> SourceInfo:
 
     Returns
     -------
-    Source information as a dictionary
+    Source information as a dictionary, including an index of the parquet
+    parts listed in the checksum file, and datasets to read them
     """
     metadata_file = Path(folder) / METADATA_FILE
     if not metadata_file.exists():
@@ -69,24 +175,70 @@ Specified: {expected_checksum}.
     Actual and Specified checksums should always match. If this is not the case,
     inform the data administrator of possible data corruption."""
         )
+    # The checksum file is now trusted, check the files it lists against it;
+    # checksums are cached, so this only hashes files that have changed
+    checksums = read_checksums(metadata["path"] / metadata["checksum_file"])
+    for name, expected in checksums.items():
+        try:
+            actual = get_checksum(metadata["path"] / name)
+        except FileNotFoundError:
+            actual = "file not found"
+        if actual != expected:
+            raise ValueError(
+                f"""load_data({folder} failed checksum validation for {name}
+   Wanted: {expected}
+   Actual: {actual}
+
+    Inform the data administrator of possible data corruption."""
+            )
+    # Only parts validated above are indexed, parquet files that are not
+    # listed in the checksum file cannot be read
+    metadata["parts"] = {
+        Path(name).stem: metadata["path"] / name
+        for name in sorted(checksums)
+        if Path(name).suffix == ".parquet"
+    }
+    # Opening a dataset reads the parquet footer, do this once per part
+    # rather than on every read
+    metadata["datasets"] = {
+        name: pa_ds.dataset(f, format="parquet") for name, f in metadata["parts"].items()
+    }
     return metadata
 
 
 def list_parts(source: SourceInfo) -> list[str]:
     "Lists available parts in source"
+    if "parts" in source:
+        return sorted(source["parts"])
     return sorted(f.stem for f in source["path"].glob("*.parquet"))
 
 
 def part_file(source: SourceInfo, resource: str) -> Path:
-    path = source["path"]
-    resource_file = path / f"{resource}.parquet"
-    if not resource_file.exists():
+    if "parts" in source:
+        # indexed by use_source(), no filesystem access needed
+        resource_file = source["parts"].get(resource)
+    else:
+        resource_file = source["path"] / f"{resource}.parquet"
+        resource_file = resource_file if resource_file.exists() else None
+    if resource_file is None:
         raise FileNotFoundError(msg_part_not_found(source, resource))
     return resource_file
 
 
+def code_in(column: str, codes: list[str]) -> pc.Expression:
+    """Filter expression selecting rows where the code in `column` is one of `codes`
+
+    FHIRflat stores codes as lists, of which only the first element is used,
+    matching the lookup done by :py:func:`polyflame.util.with_readable_terms`
+    """
+    return pc.is_in(pc.list_element(pc.field(column), 0), value_set=pa.array(codes, pa.string()))
+
+
 def read_part(
-    source: SourceInfo, resource: str, column_mappings: dict[str, str] | None = None
+    source: SourceInfo,
+    resource: str,
+    column_mappings: dict[str, str] | None = None,
+    filters: pc.Expression | None = None,
 ) -> pd.DataFrame:
     """Reads a part from a source
 
@@ -98,21 +250,46 @@ def read_part(
         Resource to read in, use :py:func:`list_parts` to obtain a list
     column_mappings
         Dictionary of column mappings
+    filters
+        Row filter expression evaluated while reading the parquet file,
+        before conversion to a dataframe. Columns used in the filter do not
+        need to be present in `column_mappings`
 
     Returns
     -------
         Resource part as a dataframe with columns mapped
     """
-    df = pd.read_parquet(part_file(source, resource))
-    if column_mappings:
-        df = df[list(column_mappings.keys())]  # only keep columns in mappings
-        return df.rename(columns=column_mappings)
+    if resource in source.get("datasets", {}):
+        dataset = source["datasets"][resource]
     else:
-        return df
+        dataset = pa_ds.dataset(part_file(source, resource), format="parquet")
+    # only read columns in mappings, parquet allows skipping the rest entirely
+    columns = list(column_mappings.keys()) if column_mappings else None
+    table = dataset.to_table(columns=columns, filter=filters, use_threads=True)
+    if column_mappings:
+        table = table.rename_columns(list(column_mappings.values()))
+    return table.to_pandas(self_destruct=True, split_blocks=True, types_mapper=_ARROW_TYPES.get)
+
+
+def read_parts(
+    source: SourceInfo, *parts: tuple[str, dict[str, str] | None, pc.Expression | None]
+) -> list[pd.DataFrame]:
+    """Reads several parts from a source
+
+    Each part is specified as a tuple of ``(resource, column_mappings, filters)``
+    arguments to :py:func:`read_part`. Parts are read concurrently if the
+    ``POLYFLAME_PARALLEL_IO`` environment variable is set to ``1``, otherwise
+    they are read one after the other.
+    """
+    if os.environ.get(PARALLEL_IO_ENV) == "1" and len(parts) > 1:
+        # pyarrow releases the GIL while reading, so threads overlap parquet I/O
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [executor.submit(read_part, source, *part) for part in parts]
+            return [f.result() for f in futures]
+    return [read_part(source, *part) for part in parts]
 
 
-def read_condition(source: SourceInfo, tx: Taxonomy | None = None):
-    tx = tx or DEFAULT_TAXONOMY
+def _read_condition(source: SourceInfo, tx: Taxonomy) -> pd.DataFrame:
     condition = read_part(
         source,
         "condition",
@@ -122,25 +299,57 @@ def read_condition(source: SourceInfo, tx: Taxonomy | None = None):
             "code.code": "condition",
             "category.code": "category",
         },
+        # drop rows without a recognised presence or absence code at read time
+        filters=code_in("extension.presenceAbsence.code", list(tx["presenceAbsence"])),
     )
-    return with_readable_terms(
+    condition = with_readable_terms(
         condition,
         tx,
         [{"term_column": "presenceAbsence", "drop_nulls": True}, {"term_column": "condition"}],
     )
+    # categorical conditions allow grouping on integer codes instead of strings
+    condition["condition"] = condition["condition"].astype("category")
+    return condition
+
+
+def read_condition(source: SourceInfo, tx: Taxonomy | None = None) -> pd.DataFrame:
+    """Reads condition part with readable terms
+
+    The last ``CONDITION_CACHE_SIZE`` results are cached, so analysis functions
+    using conditions from the same source only read the data once. A shallow
+    copy is returned, callers should not modify the data in place. Use
+    ``read_condition.cache_clear()`` to discard cached conditions.
+    """
+    tx = tx or _default_taxonomy()
+    key = (str(source["path"]), source["checksum"], id(tx))
+    cached = _CONDITION_CACHE.get(key)
+    if cached is None or cached[0] is not tx:
+        cached = (tx, _read_condition(source, tx))
+        _CONDITION_CACHE.put(key, cached)
+    return cached[1].copy(deep=False)
+
+
+read_condition.cache_clear = _CONDITION_CACHE.clear  # type: ignore[attr-defined]
 
 
 def condition_proportion(source: SourceInfo, tx: Taxonomy | None = None) -> DataPlotInfo:
     "Returns proportions of condition"
-    tx = tx or DEFAULT_TAXONOMY
+    tx = tx or _default_taxonomy()
     condition = read_condition(source, tx)
 
     # Uses the fact that True = 1 and False = 0 in Python 3, so .mean()
     # gives the proportion of rows where condition is present amongst
     # all patients for whom the condition was recorded
 
-    df = condition.groupby("condition").presenceAbsence.mean().reset_index()
-    df = df[~pd.isna(df.presenceAbsence)].rename(columns={"presenceAbsence": "proportion"})
+    condition = condition.dropna(subset=["presenceAbsence", "condition"])
+    df = (
+        condition.groupby("condition", observed=True, sort=False)
+        .presenceAbsence.mean()
+        .reset_index()
+        .rename(columns={"presenceAbsence": "proportion"})
+    )
+    # sort once, in plot order, with condition name as the tie-breaker
+    df = df.sort_values(["proportion", "condition"], ascending=[False, True], ignore_index=True)
     return {
         "data": df,
         "type": "proportion",
@@ -150,64 +359,62 @@ def condition_proportion(source: SourceInfo, tx: Taxonomy | None = None) -> Data
 
 def condition_upset(source: SourceInfo, tx: Taxonomy | None = None, N: int = 5) -> DataPlotInfo:
     "Returns UpSet plot data, for top `N` conditions (default 5)"
-    tx = tx or DEFAULT_TAXONOMY
+    tx = tx or _default_taxonomy()
     condition = read_condition(source, tx)[["subject", "condition", "presenceAbsence"]]
     # get top N conditions
     condition_counts = condition[condition.presenceAbsence].condition.value_counts()
-    top_conditions = list(condition_counts[:N].index)
+    # value_counts() on a categorical also lists conditions that are never present
+    top_conditions = list(condition_counts[condition_counts > 0][:N].index)
     condition = condition[condition.condition.isin(top_conditions)]
 
-    df = condition.pivot_table(
-        index="subject", columns="condition", values="presenceAbsence", aggfunc="sum", fill_value=0
+    df = (
+        condition.groupby(["subject", "condition"], observed=True)
+        .presenceAbsence.any()
+        .unstack("condition", fill_value=False)
     )
-    df = df.astype(bool)
     return {"data": df, "type": "upset", "title": "Condition UpSet plot"}
 
 
 def age_pyramid(
     source: SourceInfo,
     tx: Taxonomy | None = None,
-    age_bins: Sequence[int] = DEFAULT_AGE_BINS,
+    age_bins: Sequence[int] | np.ndarray = DEFAULT_AGE_BINS,
 ) -> DataPlotInfo:
-    tx = tx or DEFAULT_TAXONOMY
-    patient = with_readable_terms(
-        read_part(
-            source,
+    tx = tx or _default_taxonomy()
+    patient, encounter = read_parts(
+        source,
+        (
             "patient",
             {
                 "extension.birthSex.code": "gender",
                 "extension.age.value": "age",
-                "extension.age.code": "age_unit",
                 "id": "subject",
             },
+            # drop infants, whose ages are not recorded in years
+            code_in("extension.age.code", AGE_UNITS_YEARS),
         ),
-        tx,
-        [{"term_column": "gender"}],
-    )
-
-    encounter = with_readable_terms(
-        read_part(
-            source,
+        (
             "encounter",
             {"subject": "subject", "admission.dischargeDisposition.code": "outcome"},
+            None,
         ),
-        tx,
-        [{"term_column": "outcome"}],
     )
-    encounter["subject"] = encounter["subject"].map(lambda x: x.removeprefix("Patient/"))
+    encounter["subject"] = encounter["subject"].str.removeprefix("Patient/")
 
-    # http://unitsofmeasure.org|a represents years - drop infants
-    patient = patient[
-        (patient.age_unit == "http://unitsofmeasure.org|a")
-        | (patient.age_unit == "https://unitsofmeasure.org|a")
-    ]
-    patient = patient.merge(encounter, on="subject", how="inner")
+    patient = patient.set_index("subject").join(encounter.set_index("subject"), how="inner")
+    # map terms once, on the joined rows only
+    patient = with_readable_terms(
+        patient, tx, [{"term_column": "gender"}, {"term_column": "outcome"}]
+    )
 
     # create age groups and format them as strings
-    patient["age_group"] = pd.cut(patient["age"], bins=age_bins).map(
-        lambda iv: f"{iv.left + 1} - {iv.right}"
+    labels = (
+        DEFAULT_AGE_GROUP_LABELS if age_bins is DEFAULT_AGE_BINS else age_group_labels(age_bins)
     )
-    patient = patient[["gender", "age_group", "outcome"]].value_counts().reset_index()
+    patient["age_group"] = age_groups(patient["age"], age_bins, labels)
+    for column in ["gender", "outcome"]:
+        patient[column] = patient[column].astype("category")
+    patient = patient[["gender", "age_group", "outcome"]].value_counts(sort=False).reset_index()
 
     return {
         "data": patient,
@@ -6,10 +6,9 @@ Based on ISARICDraw.py:
 https://github.com/ISARICResearch/VERTEX/blob/main/IsaricDraw.py
 """
 
-import colorsys
+import hashlib
 import itertools
 import sys
-from collections import OrderedDict
 
 if sys.version_info < (3, 11):
     from typing_extensions import Unpack  # pragma: no cover
@@ -17,15 +16,37 @@ else:
     from typing import Unpack  # pragma: no cover
 
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 
 from .palettes import PALETTE_GLOBALDOTHEALTH
 from .types import DataPlotInfo, PlotInfo, PlotType
+from .util import LRUCache
 
 DEFAULT_HEIGHT = 430
 DEFAULT_FONT = "Helvetica"
+INTERSECTIONS_CACHE_SIZE = 8
+
+# Least recently used cache of _compute_intersections() results, keyed on
+# categories and a digest of the row bitmasks
+_INTERSECTIONS_CACHE: LRUCache[tuple[tuple, bytes], dict[tuple, int]] = LRUCache(
+    INTERSECTIONS_CACHE_SIZE
+)
+
+
+# Traces are built as plain dicts rather than graph objects, so that
+# plotly validates them once when the figure is created instead of
+# once per trace and again when added to the figure
+
+
+def _bar(**kwargs) -> dict:
+    return {"type": "bar", **kwargs}
+
+
+def _scatter(**kwargs) -> dict:
+    return {"type": "scatter", **kwargs}
 
 
 def ax(cols: dict[str, str], key: str) -> str:
@@ -46,37 +67,107 @@ def require_columns(
         raise ValueError(f"Required columns or column mappings not present: {missing_columns}")
 
 
+def _rgb_to_hls(rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "Vectorized :py:func:`colorsys.rgb_to_hls` over an (N, 3) array"
+    r, g, b = rgb.T
+    maxc, minc = rgb.max(axis=1), rgb.min(axis=1)
+    sumc, rangec = maxc + minc, maxc - minc
+    luminance = sumc / 2.0
+    grey = rangec == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        saturation = np.where(luminance <= 0.5, rangec / sumc, rangec / (2.0 - maxc - minc))
+        rc, gc, bc = (maxc - r) / rangec, (maxc - g) / rangec, (maxc - b) / rangec
+    hue = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    hue = (hue / 6.0) % 1.0
+    return np.where(grey, 0.0, hue), luminance, np.where(grey, 0.0, saturation)
+
+
+def _hls_to_rgb(hue: np.ndarray, luminance: np.ndarray, saturation: np.ndarray) -> np.ndarray:
+    "Vectorized :py:func:`colorsys.hls_to_rgb`, returns an (N, 3) array"
+    m2 = np.where(
+        luminance <= 0.5,
+        luminance * (1.0 + saturation),
+        luminance + saturation - (luminance * saturation),
+    )
+    m1 = 2.0 * luminance - m2
+
+    def channel(h: np.ndarray) -> np.ndarray:
+        h = h % 1.0
+        return np.select(
+            [h < 1 / 6, h < 0.5, h < 2 / 3],
+            [m1 + (m2 - m1) * h * 6.0, m2, m1 + (m2 - m1) * (2 / 3 - h) * 6.0],
+            default=m1,
+        )
+
+    rgb = np.stack([channel(hue + 1 / 3), channel(hue), channel(hue - 1 / 3)], axis=1)
+    return np.where((saturation == 0.0)[:, None], luminance[:, None], rgb)
+
+
+def lighten_many(hex_colors: list[str], factor: float = 0.6) -> list[str]:
+    "Lightens a list of hex colors by a fraction"
+    assert 0 < factor < 1, "Factor should be a fraction between 0 and 1"
+    hex_colors = [c.lstrip("#") for c in hex_colors]
+    assert all(len(c) == 6 for c in hex_colors), "Invalid hex color format"
+    rgb = np.frombuffer(bytes.fromhex("".join(hex_colors)), dtype=np.uint8).reshape(-1, 3) / 255.0
+    hue, luminance, saturation = _rgb_to_hls(rgb)
+    luminance = np.minimum(1, luminance + factor * (1 - luminance))
+    lightened = (_hls_to_rgb(hue, luminance, saturation) * 255).astype(int)
+    return ["#" + bytes(row.astype(np.uint8)).hex() for row in lightened]
+
+
 def lighten(hex_color: str, factor: float = 0.6) -> str:
     "Lightens a hex color by a fraction"
-    assert 0 < factor < 1, "Factor should be a fraction between 0 and 1"
-    hex_color = hex_color.lstrip("#")
-    assert len(hex_color) == 6, "Invalid hex color format"
-    r, g, b = (
-        int(hex_color[0:2], 16) / 255.0,
-        int(hex_color[2:4], 16) / 255.0,
-        int(hex_color[4:6], 16) / 255.0,
-    )
-    hue, luminance, saturation = colorsys.rgb_to_hls(r, g, b)
-    luminance = min(1, luminance + factor * (1 - luminance))
-    rgb = [int(x * 255) for x in colorsys.hls_to_rgb(hue, luminance, saturation)]
-    return "#" + "".join(f"{x:#04x}"[2:] for x in rgb)
+    return lighten_many([hex_color], factor)[0]
 
 
-def _compute_intersections(dataframe: pd.DataFrame) -> OrderedDict:
+def _compute_intersections(dataframe: pd.DataFrame) -> dict[tuple, int]:
     """Find all combinations of categories and their intersection sizes
     Assumes a dataframe has only one-hot encoded (binary 0 or 1) values
-    with the column labels as the categories
+    with the column labels as the categories. Combinations with an empty
+    intersection are omitted.
+
+    Results are cached on the categories and the content of the dataframe,
+    so that repeatedly plotting the same data is cheap.
     """
-    categories = dataframe.columns
-    intersections = {}
-    for r in range(1, len(categories) + 1):
-        for combo in itertools.combinations(categories, r):
-            # Intersection is where all categories in the combo have a 1
-            mask = dataframe[list(combo)].all(axis=1)
-            intersections[combo] = int(mask.sum())
+    categories = tuple(dataframe.columns)
+    n = len(categories)
+    # Encode each row's set of categories as a bitmask, with bit i set
+    # if the row belongs to category i
+    masks = dataframe.to_numpy(dtype=np.int64) @ (1 << np.arange(n, dtype=np.int64))
+
+    key = (categories, hashlib.blake2b(masks).digest())
+    result = _INTERSECTIONS_CACHE.get(key)
+    if result is None:
+        result = _intersections_from_masks(categories, masks)
+        _INTERSECTIONS_CACHE.put(key, result)
+    return dict(result)
+
+
+def _intersections_from_masks(categories: tuple, masks: np.ndarray) -> dict[tuple, int]:
+    "Intersection sizes from per-row category bitmasks, see _compute_intersections()"
+    n = len(categories)
+    # Count rows for each bitmask
+    counts = np.bincount(masks, minlength=1 << n)
+
+    # Sum over supersets: afterwards counts[mask] is the number of rows
+    # belonging to (at least) all categories in mask
+    for i in range(n):
+        # axis 1 of the view is bit i, add masks with the bit set to those without
+        view = counts.reshape(-1, 2, 1 << i)
+        view[:, 0, :] += view[:, 1, :]
+
+    # Only label non-empty intersections, in the order of itertools.combinations()
+    combos = [
+        (mask, tuple(i for i in range(n) if mask >> i & 1))
+        for mask in (np.flatnonzero(counts[1:]) + 1).tolist()
+    ]
+    combos.sort(key=lambda c: (len(c[1]), c[1]))
+    intersections = {
+        tuple(categories[i] for i in combo): int(counts[mask]) for mask, combo in combos
+    }
 
     # Sort intersections by size in descending order
-    return OrderedDict(sorted(intersections.items(), key=lambda x: x[1], reverse=True))
+    return dict(sorted(intersections.items(), key=lambda x: x[1], reverse=True))
 
 
 def upset(data, **kwargs: Unpack[PlotInfo]) -> go.Figure:
@@ -112,60 +203,52 @@ def upset(data, **kwargs: Unpack[PlotInfo]) -> go.Figure:
         subplot_titles=("Intersection Size", ""),  # Titles for subplots
     )
 
-    # Create bar chart traces for intersection sizes
-    bar_traces = []
-    for intersection, size in intersections.items():
-        if size > 0:
-            bar_traces.append(
-                go.Bar(
-                    y=[size],
-                    x=[" & ".join(intersection)],
-                    orientation="v",
-                    name=" & ".join(intersection),
-                    marker={"color": colors[0]},
-                )
-            )
-
-    # Add bar traces to the top subplot
-    for trace in bar_traces:
-        fig.add_trace(trace, row=1, col=1)
+    # Bar chart of intersection sizes, as a single trace
+    x_names = [" & ".join(intersection) for intersection in intersections]
+    bar_trace = _bar(
+        y=list(intersections.values()),
+        x=x_names,
+        orientation="v",
+        marker={"color": colors[0]},
+    )
 
-    # Create matrix scatter plot and lines
-    for intersection, size in intersections.items():
-        if size == 0:
-            continue
-        x_name = " & ".join(intersection)
-        y_coords = [-1 - categories.get_loc(cat) for cat in categories if cat in intersection]  # type: ignore
-        x_coords = [x_name] * len(y_coords)
-
-        # Add scatter plot for each point in the intersection
-        fig.add_trace(
-            go.Scatter(
-                x=x_coords,
-                y=y_coords,
+    # Matrix of points for each intersection, with lines connecting points
+    # in the same intersection. All points go into one markers trace, and
+    # all lines into one lines trace, with None separating the lines
+    x_points, y_points, x_lines, y_lines = [], [], [], []
+    y_position = {cat: -1 - i for i, cat in enumerate(categories)}
+    for intersection, x_name in zip(intersections, x_names, strict=True):
+        # intersections list categories in column order
+        y_coords = [y_position[cat] for cat in intersection]
+        x_points.extend([x_name] * len(y_coords))
+        y_points.extend(y_coords)
+        if len(y_coords) > 1:  # Only add a line if there are at least two points
+            x_lines.extend([x_name, x_name, None])
+            y_lines.extend([max(y_coords), min(y_coords), None])
+
+    fig.add_traces(
+        [
+            bar_trace,
+            _scatter(
+                x=x_points,
+                y=y_points,
                 mode="markers",
-                marker=dict(size=10, color="black"),
+                marker={"size": 10, "color": "black"},
                 showlegend=False,
                 hoverinfo="skip",
             ),
-            row=2,
-            col=1,
-        )
-
-        # Add a line connecting the points
-        if len(y_coords) > 1:  # Only add a line if there are at least two points
-            fig.add_trace(
-                go.Scatter(
-                    x=x_coords,
-                    y=y_coords,
-                    mode="lines",
-                    line=dict(color="black", width=1),
-                    showlegend=False,
-                    hoverinfo="skip",
-                ),
-                row=2,
-                col=1,
-            )
+            _scatter(
+                x=x_lines,
+                y=y_lines,
+                mode="lines",
+                line={"color": "black", "width": 1},
+                showlegend=False,
+                hoverinfo="skip",
+            ),
+        ],
+        rows=[1, 2, 2],
+        cols=[1, 1, 1],
+    )
 
     # Update y-axis for the bar chart subplot
     fig.update_yaxes(title_text="Intersection Size", row=1, col=1)
@@ -197,61 +280,57 @@ def upset(data, **kwargs: Unpack[PlotInfo]) -> go.Figure:
 
 def cumulative_bar(data: pd.DataFrame, **kwargs: Unpack[PlotInfo]) -> go.Figure:
     """Pivot the DataFrame to get cumulative sums for each stack_group at each timepoint
-    Ensure the 'timepoint' column is sorted or create a complete range if necessary
+    Timepoints are sorted, only timepoints present in the data are shown
     """
     cols = kwargs.get("cols", {})
     require_columns(data, ["timepoint", "stack_group", "value"], cols)
     colors = get_colors(kwargs)
-    timepoints = sorted(data[ax(cols, "timepoint")].unique())
-    # all_timepoints = range(min(timepoints), max(timepoints) + 1)
-    all_timepoints = range(int(min(timepoints)), int(max(timepoints)) + 1)
-
-    # Create a complete DataFrame with all timepoints
-    complete_df = pd.DataFrame(all_timepoints, columns=[ax(cols, "timepoint")])
-
-    # Merge the original dataframe with the complete timepoints dataframe to fill gaps
-    merged_df = pd.merge(complete_df, data, on=ax(cols, "timepoint"), how="left")
-
-    # Pivot the merged DataFrame to get cumulative sums for each stack_group at each timepoint
-    pivot_df = merged_df.pivot_table(
-        index="timepoint",
-        columns=ax(cols, "stack_group"),
-        values=ax(cols, "value"),
-        aggfunc="sum",
+
+    # Sum values for each stack_group at each timepoint, with timepoints as rows
+    # and stack_groups as columns, missing combinations are left as NaN
+    pivot_df = (
+        data.groupby([ax(cols, "timepoint"), ax(cols, "stack_group")])[ax(cols, "value")]
+        .sum()
+        .unstack(ax(cols, "stack_group"))
     )
 
-    # Forward fill missing values and then calculate the cumulative sum
-    pivot_df_ffill = pivot_df.fillna(method="ffill").cumsum()  # type: ignore
+    # Forward fill missing values and then calculate the cumulative sum in place,
+    # timepoints before the first value of a stack_group stay missing
+    values = pivot_df.ffill().to_numpy(dtype=float)
+    missing = np.isnan(values)
+    np.nancumsum(values, axis=0, out=values)
+    values[missing] = np.nan
+    pivot_df_ffill = pd.DataFrame(values, index=pivot_df.index, columns=pivot_df.columns)
 
     # Create traces for each stack_group with colors from the base_color_map
     assert len(pivot_df_ffill.columns) <= len(
         colors
     ), f"Not enough colors specified, needed for\n{pivot_df_ffill.columns}\ngot {colors}"
     traces = [
-        go.Bar(
+        _bar(
             x=pivot_df_ffill.index,
             y=pivot_df_ffill[stack_group],
             name=stack_group,
             orientation="v",
-            marker=dict(color=color),
+            marker={"color": color},
         )
         for stack_group, color in zip(pivot_df_ffill.columns, colors, strict=False)
     ]
 
     return go.Figure(
         data=traces,
-        layout=go.Layout(
-            title=kwargs.get("title", "Cumulative bar chart"),
-            barmode="stack",
-            bargap=0,  # Set the gap between bars of the same category to 0
-            xaxis=dict(title=ax(cols, "x")),
-            yaxis=dict(title=ax(cols, "y")),
-            legend=dict(x=1.05, y=1),
-            margin=dict(l=100, r=100, t=100, b=50),
-            paper_bgcolor="white",
-            plot_bgcolor="white",
-            height=340,
-        ),
+        layout={
+            "title": kwargs.get("title", "Cumulative bar chart"),
+            "barmode": "stack",
+            "bargap": 0,  # Set the gap between bars of the same category to 0
+            "xaxis": {"title": ax(cols, "x")},
+            "yaxis": {"title": ax(cols, "y")},
+            "legend": {"x": 1.05, "y": 1},
+            "margin": {"l": 100, "r": 100, "t": 100, "b": 50},
+            "paper_bgcolor": "white",
+            "plot_bgcolor": "white",
+            "height": 340,
+        },
     )
 
 
@@ -281,98 +360,122 @@ def pyramid(data: pd.DataFrame, **kwargs: Unpack[PlotInfo]) -> go.Figure:
     sides = data[ax(cols, "side")].unique()
     assert len(sides) == 2, "Dataframe must have exactly two unique values for the 'side' column"
 
-    # Build color map
-    slots = list(itertools.product(sides, stack_groups))
-    assert len(slots) <= len(
+    # Build color map, one row of colours per side
+    n_slots = len(sides) * len(stack_groups)
+    assert n_slots <= len(
         colors
-    ), f"Number of provided colours ({len(colors)}) less than required ({len(slots)})"
-    color_map = dict(zip(slots, colors, strict=False))
+    ), f"Number of provided colours ({len(colors)}) less than required ({n_slots})"
+    color_map = np.asarray(colors[:n_slots], dtype=object).reshape(len(sides), len(stack_groups))
 
-    # Prepare Data Traces
+    # Prepare Data Traces, splitting data into slots in a single pass
     traces = []
-    max_value = data[c_value].abs().max()
-    for side, stack_group in slots:
-        subset = data[(data[c_side] == side) & (data[c_stack_group] == stack_group)]
-        if subset.empty:
+    subsets = dict(iter(data.groupby([c_side, c_stack_group], sort=False, observed=True)))
+    sign = {sides[0]: -1, sides[1]: 1}  # first side is drawn to the left
+    for (i, side), (j, stack_group) in itertools.product(enumerate(sides), enumerate(stack_groups)):
+        subset = subsets.get((side, stack_group))
+        if subset is None:
             continue
         # Get color from the color_map using both side and stack_group
-        color = color_map[side, stack_group]
+        color = color_map[i, j]
         traces.append(
-            go.Bar(
+            _bar(
                 y=subset[c_y],
-                x=(-subset[c_value] if side == sides[0] else subset[c_value]),
+                x=sign[side] * subset[c_value].to_numpy(),
                 name=f"{side} {stack_group}",
                 orientation="h",
-                marker=dict(color=color),  # Use the color from the color_map
+                marker={"color": color},  # Use the color from the color_map
             )
         )
 
-    # Sorting y-axis categories
-    split_ranges = [
-        (int(r.split("-")[0]), int(r.split("-")[1])) for r in data[ax(cols, "y")].unique()
-    ]
-    sorted_ranges = sorted(split_ranges, key=lambda x: x[0])
-    sorted_y_axis = [f"{start}-{end}" for start, end in sorted_ranges]
+    # Sorting y-axis categories by the start of each range
+    y_labels = np.asarray(data[c_y].unique())
+    starts = np.fromiter(
+        (int(r.split("-")[0]) for r in y_labels), dtype=np.int32, count=len(y_labels)
+    )
+    sorted_y_axis = y_labels[np.argsort(starts, kind="stable")].tolist()
 
-    # sorted_y_axis = sorted(dataframe['y_axis'].unique(), reverse=True)
-    max_value = sum(data.groupby(c_stack_group)[c_value].apply(max))
+    max_value = data.groupby(c_stack_group, observed=True)[c_value].max().sum()
     # Layout settings
-    layout = go.Layout(
-        title=kwargs.get("title", "Pyramid plot"),
-        barmode="relative",
-        xaxis=dict(
-            title="Count",
-            range=[-max_value, max_value],
-            automargin=True,
-            tickvals=[-max_value, -max_value / 2, 0, max_value / 2, max_value],
-            ticktext=[
+    layout = {
+        "title": kwargs.get("title", "Pyramid plot"),
+        "barmode": "relative",
+        "xaxis": {
+            "title": "Count",
+            "range": [-max_value, max_value],
+            "automargin": True,
+            "tickvals": [-max_value, -max_value / 2, 0, max_value / 2, max_value],
+            "ticktext": [
                 max_value,
                 max_value / 2,
                 0,
                 max_value / 2,
                 max_value,
             ],  # Labels as positive numbers
-        ),
-        yaxis=dict(
-            title="Category", automargin=True, categoryorder="array", categoryarray=sorted_y_axis
-        ),
-        annotations=[
-            dict(
-                x=(
+        },
+        "yaxis": {
+            "title": "Category",
+            "automargin": True,
+            "categoryorder": "array",
+            "categoryarray": sorted_y_axis,
+        },
+        "annotations": [
+            {
+                "x": (
                     0.2 if side == sides[0] else 0.8
                 ),  # Position at 10%, (resp. 90%) from the left edge of the graph
-                y=1.1,  # Position just above the top of the graph
-                xref="paper",
-                yref="paper",
-                text=side,
-                showarrow=False,
-                font=dict(family="Arial", size=14, color="black"),
-                align="center",
-            )
+                "y": 1.1,  # Position just above the top of the graph
+                "xref": "paper",
+                "yref": "paper",
+                "text": side,
+                "showarrow": False,
+                "font": {"family": "Arial", "size": 14, "color": "black"},
+                "align": "center",
+            }
             for side in sides
         ],
-        shapes=[
+        "shapes": [
             # Line at x=0 for reference
-            dict(
-                type="line",
-                x0=0,
-                y0=0,  # Start point of the line (y0=-1 to ensure it starts from the bottom)
-                x1=0,
-                y1=1,  # End point of the line (y1=1 to ensure it goes to the top)
-                xref="x",
-                yref="paper",  # Reference to x axis and paper for y axis
-                line=dict(color="Black", width=2),
-            )
+            {
+                "type": "line",
+                "x0": 0,
+                "y0": 0,  # Start point of the line (y0=-1 to ensure it starts from the bottom)
+                "x1": 0,
+                "y1": 1,  # End point of the line (y1=1 to ensure it goes to the top)
+                "xref": "x",
+                "yref": "paper",  # Reference to x axis and paper for y axis
+                "line": {"color": "Black", "width": 2},
+            }
         ],
-        legend=dict(x=1.05, y=1),
-        margin=dict(l=100, r=100, t=100, b=50),
-        paper_bgcolor="white",
-        plot_bgcolor="white",
-        height=DEFAULT_HEIGHT,
-    )
+        "legend": {"x": 1.05, "y": 1},
+        "margin": {"l": 100, "r": 100, "t": 100, "b": 50},
+        "paper_bgcolor": "white",
+        "plot_bgcolor": "white",
+        "height": DEFAULT_HEIGHT,
+    }
     return go.Figure(data=traces, layout=layout)
 
 
+def _mean_by(labels: pd.Series, values: pd.Series) -> pd.Series:
+    """Mean of values grouped by labels, skipping missing values
+
+    Equivalent to ``values.groupby(labels, observed=True).mean()``, computed
+    on categorical codes instead of hashing labels in a groupby.
+    """
+    categorical = pd.Categorical(labels)
+    codes = categorical.codes
+    vals = values.to_numpy(dtype=float)
+    n = len(categorical.categories)
+    observed = np.bincount(codes[codes >= 0], minlength=n) > 0
+    valid = (codes >= 0) & ~np.isnan(vals)
+    counts = np.bincount(codes[valid], minlength=n)
+    sums = np.bincount(codes[valid], weights=vals[valid], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return pd.Series(
+        means[observed], index=categorical.categories[observed], name=values.name
+    ).rename_axis(labels.name)
+
+
 def proportion(data: pd.DataFrame, **kwargs: Unpack[PlotInfo]) -> go.Figure:
     """Proportions plot by label
 
@@ -391,64 +494,55 @@ def proportion(data: pd.DataFrame, **kwargs: Unpack[PlotInfo]) -> go.Figure:
     colors = get_colors(kwargs)
     c_label = ax(cols, "label")
     c_proportion = ax(cols, "proportion")
-    dataframe = data.sort_values(by=[c_label], ascending=False)
 
-    # Calculate the proportion of 'Yes' for each condition and sort
-    condition_proportions = (
-        dataframe.groupby(c_label)[c_proportion].mean().sort_values(ascending=True)
-    )
+    # Calculate the proportion of 'Yes' for each condition and sort; data
+    # that is already aggregated (one row per label) is used as is, rows
+    # with missing labels are dropped as in a groupby
+    if data[c_label].is_unique and data[c_label].notna().all():
+        condition_proportions = data.set_index(c_label)[c_proportion].sort_index()
+    else:
+        condition_proportions = _mean_by(data[c_label], data[c_proportion])
+    condition_proportions = condition_proportions.sort_values(ascending=True)
 
     sorted_conditions = condition_proportions.index.tolist()
 
-    # Prepare Data Traces
-    traces = []
+    # Prepare Data Traces, one stacked trace each for "Yes" and "No"
     yes_color, no_color = colors[0], lighten(colors[0])
-
-    for condition in sorted_conditions:
-        yes_count = condition_proportions[condition]
-        no_count = 1 - yes_count
-
-        # Add "Yes" bar
-        traces.append(
-            go.Bar(
-                x=[yes_count],
-                y=[condition],
-                name="Yes",
-                orientation="h",
-                marker=dict(color=yes_color),
-                showlegend=condition == sorted_conditions[0],  # Show legend only for the first
-            )
-        )
-
-        # Add "No" bar
-        traces.append(
-            go.Bar(
-                x=[no_count],
-                y=[condition],
-                name="No",
-                orientation="h",
-                marker=dict(color=no_color),
-                showlegend=condition == sorted_conditions[0],  # Show legend only for the first
-            )
-        )
-
-    layout = go.Layout(
-        title=kwargs.get("title", "Proportion plot"),
-        font_family=DEFAULT_FONT,
-        barmode="stack",
-        xaxis=dict(title="Proportion", range=[0, 1]),
-        yaxis=dict(
-            title=c_label,
-            automargin=True,
-            tickmode="array",
-            tickvals=sorted_conditions,
-            ticktext=sorted_conditions,
+    yes_counts = condition_proportions.to_numpy(dtype=float)
+    traces = [
+        _bar(
+            x=yes_counts,
+            y=sorted_conditions,
+            name="Yes",
+            orientation="h",
+            marker={"color": yes_color},
         ),
-        bargap=0.1,  # Smaller gap between bars. Adjust this value as needed.
-        legend=dict(x=1.05, y=1),
-        margin=dict(l=100, r=100, t=100, b=50),
-        height=350,
-    )
+        _bar(
+            x=1 - yes_counts,
+            y=sorted_conditions,
+            name="No",
+            orientation="h",
+            marker={"color": no_color},
+        ),
+    ]
+
+    layout = {
+        "title": kwargs.get("title", "Proportion plot"),
+        "font_family": DEFAULT_FONT,
+        "barmode": "stack",
+        "xaxis": {"title": "Proportion", "range": [0, 1]},
+        "yaxis": {
+            "title": c_label,
+            "automargin": True,
+            "tickmode": "array",
+            "tickvals": sorted_conditions,
+            "ticktext": sorted_conditions,
+        },
+        "bargap": 0.1,  # Smaller gap between bars. Adjust this value as needed.
+        "legend": {"x": 1.05, "y": 1},
+        "margin": {"l": 100, "r": 100, "t": 100, "b": 50},
+        "height": 350,
+    }
 
     return go.Figure(data=traces, layout=layout)
 
@@ -10,11 +10,12 @@ from pathlib import Path
 from typing import Literal, TypedDict
 
 if sys.version_info < (3, 11):
-    from typing_extensions import Required  # pragma: no cover
+    from typing_extensions import NotRequired, Required  # pragma: no cover
 else:
-    from typing import Required  # pragma: no cover
+    from typing import NotRequired, Required  # pragma: no cover
 
 import pandas as pd
+import pyarrow.dataset
 
 PlotType = Literal["pyramid", "upset", "proportion"]
 Taxonomy = dict[str, dict[str, str | bool]]
@@ -44,6 +45,12 @@ class SourceInfo(TypedDict):
     "Data integrity checksum"
     checksum_file: str
     "File for which data integrity checksum is calculated"
+    parts: NotRequired[dict[str, Path]]
+    """Parquet files in the source by resource name, indexed once by
+    :py:func:`polyflame.fhirflat.use_source`"""
+    datasets: NotRequired[dict[str, pyarrow.dataset.Dataset]]
+    """Datasets for the parquet files in ``parts``, opened once by
+    :py:func:`polyflame.fhirflat.use_source` and shared by reads"""
 
 
 class PlotInfo(TypedDict, total=False):
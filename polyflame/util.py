@@ -1,7 +1,12 @@
+import functools
 import hashlib
+import mmap
+import os
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Generic, TypeVar
 
 import pandas as pd
 
@@ -12,6 +17,48 @@ else:
 
 from .types import ReadableTermColumnInfo, SourceInfo, Taxonomy
 
+CHECKSUM_BLOCK_SIZE = 1 << 20
+CHECKSUM_MMAP_MIN_SIZE = 1 << 16
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Least recently used cache holding at most `maxsize` items
+
+    Access is guarded by a lock, so a cache can be shared by concurrent callers.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> V | None:
+        "Returns the cached value for `key`, or None, marking it as recently used"
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        "Caches `value` for `key`, evicting least recently used items over `maxsize`"
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        "Removes all items from the cache"
+        with self._lock:
+            self._items.clear()
+
 
 def _readable_term(tx: Taxonomy, section: str) -> Callable[[list[str]], str | bool | None]:
     def func(x: list[str]) -> str | bool | None:
@@ -30,30 +77,76 @@ def _readable_term(tx: Taxonomy, section: str) -> Callable[[list[str]], str | bo
 def with_readable_terms(
     data: pd.DataFrame, tx: Taxonomy, columns: list[ReadableTermColumnInfo]
 ) -> pd.DataFrame:
-    "In place replacement of codes with readable terms"
+    """In place replacement of codes with readable terms
+
+    Rows with codes not in the taxonomy are dropped for columns with
+    ``drop_nulls`` set.
+    """
     for c in columns:
-        data.loc[:, c["term_column"]] = data[c["term_column"]].map(
-            _readable_term(tx, c.get("taxonomy_section") or c["term_column"])
-        )
-        if c.get("drop_nulls", False):
-            data = data[~pd.isnull(data[c["term_column"]])]
+        col = c["term_column"]
+        data.loc[:, col] = data[col].map(_readable_term(tx, c.get("taxonomy_section") or col))
+    # drop rows once for all columns, rather than copying the data per column
+    if drop_columns := [c["term_column"] for c in columns if c.get("drop_nulls", False)]:
+        data = data.dropna(subset=drop_columns)
     return data
 
 
-def get_checksum(file: str | Path) -> str:
-    "Calculate the SHA-256 checksum of a file"
-    h = hashlib.sha256()
+def _sha256(file: str | Path) -> str:
     with open(file, "rb") as fp:
-        while True:
-            data = fp.read(4096)
-            if len(data) == 0:
-                break
-            h.update(data)
-    return h.hexdigest()
+        if os.fstat(fp.fileno()).st_size >= CHECKSUM_MMAP_MIN_SIZE:
+            # hash the mapped file directly instead of copying it through buffers
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        if sys.version_info < (3, 11):
+            h = hashlib.sha256()
+            while data := fp.read(CHECKSUM_BLOCK_SIZE):
+                h.update(data)
+            return h.hexdigest()
+        return hashlib.file_digest(fp, "sha256").hexdigest()
 
 
+@functools.lru_cache(maxsize=128)
+def _cached_sha256(file: str, mtime_ns: int, size: int) -> str:  # noqa: ARG001
+    # mtime_ns and size are only part of the cache key
+    return _sha256(file)
+
+
+def get_checksum(file: str | Path) -> str:
+    """Calculate the SHA-256 checksum of a file
+
+    Checksums are cached for the lifetime of the process, keyed on the file
+    path, modification time and size, so a file is only hashed again if it
+    has changed. Use ``get_checksum.cache_clear()`` to discard cached checksums.
+    """
+    st = os.stat(file)
+    return _cached_sha256(str(Path(file).resolve()), st.st_mtime_ns, st.st_size)
+
+
+get_checksum.cache_clear = _cached_sha256.cache_clear  # type: ignore[attr-defined]
+
+
+def read_checksums(file: str | Path) -> dict[str, str]:
+    """Read a checksum file in the format written by ``sha256sum``
+
+    Returns a dictionary mapping file names, relative to the folder of the
+    checksum file, to their SHA-256 checksums
+    """
+    checksums = {}
+    for line in Path(file).read_text().splitlines():
+        if line.strip():
+            digest, name = line.split(maxsplit=1)
+            # sha256sum marks files read in binary mode with a leading '*'
+            checksums[name.removeprefix("*")] = digest.lower()
+    return checksums
+
+
+@functools.lru_cache(maxsize=32)
 def load_taxonomy(file_part: str) -> Taxonomy:
-    "Loads taxonomy from a TOML file"
+    """Loads taxonomy from a TOML file
+
+    Taxonomies are cached, so repeated calls return the same dictionary,
+    which should not be modified.
+    """
     tx_file = Path(__file__).parent / "taxonomy" / (file_part.removesuffix(".toml") + ".toml")
     if not tx_file.exists():
         raise FileNotFoundError(
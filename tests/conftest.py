@@ -0,0 +1,36 @@
+"""
+Shared fixtures for polyflame tests
+"""
+
+from pathlib import Path
+
+import pytest
+
+from polyflame.fhirflat import use_source
+from polyflame.types import SourceInfo, Taxonomy
+from polyflame.util import load_taxonomy
+
+DATA = Path("polyflame/samples/sample-fhirflat")
+CHECKSUM = "03cc8e28d97a6a3ab20926d7c3f891f14e119eb882c6e8d3deb07e1b79eed089"
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    "Skip benchmarks unless they are requested with --benchmark-only"
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def source() -> SourceInfo:
+    "Sample FHIRflat source, validated once per test session"
+    return use_source(DATA, CHECKSUM)
+
+
+@pytest.fixture(scope="session")
+def taxonomy() -> Taxonomy:
+    "Taxonomy for the sample FHIRflat source"
+    return load_taxonomy("fhirflat-isaric3")
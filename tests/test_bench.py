@@ -0,0 +1,39 @@
+"""
+Benchmarks for polyflame, run with pytest-benchmark using ``pytest --benchmark-only``
+"""
+
+import pytest
+
+from polyflame.fhirflat import (
+    age_pyramid,
+    condition_upset,
+    read_condition,
+    read_part,
+    with_readable_terms,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_condition_upset_bench(benchmark, source):
+    # clear cached conditions before each round, to time reading the part as well
+    benchmark.pedantic(
+        condition_upset, args=(source,), setup=read_condition.cache_clear, rounds=20, warmup_rounds=1
+    )
+
+
+def test_age_pyramid_bench(benchmark, source):
+    benchmark(age_pyramid, source)
+
+
+def test_with_readable_terms_bench(benchmark, source, taxonomy):
+    columns = {"extension.presenceAbsence.code": "presenceAbsence", "code.code": "condition"}
+    condition = read_part(source, "condition", columns)
+    terms = [{"term_column": "presenceAbsence", "drop_nulls": True}, {"term_column": "condition"}]
+    # copy the data outside the timed call, as with_readable_terms() modifies it
+    benchmark.pedantic(
+        with_readable_terms,
+        setup=lambda: ((condition.copy(), taxonomy, terms), {}),
+        rounds=100,
+        warmup_rounds=1,
+    )
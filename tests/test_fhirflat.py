@@ -2,12 +2,19 @@
 Tests for polyflame.fhirflat
 """
 
+import shutil
 from pathlib import Path
+
+import numpy as np
+import pandas as pd
 import pytest
 
 from polyflame.types import SourceInfo
 from polyflame.fhirflat import (
+    _CONDITION_CACHE,
     read_part,
+    read_parts,
+    read_condition,
     read_metadata,
     use_source,
     list_parts,
@@ -15,28 +22,83 @@ from polyflame.fhirflat import (
     condition_upset,
     condition_proportion,
     age_pyramid,
+    age_groups,
+    age_group_labels,
+    DEFAULT_AGE_BINS,
+    DEFAULT_AGE_GROUP_LABELS,
 )
 
 DATA = Path("polyflame/samples/sample-fhirflat")
 CHECKSUM = "03cc8e28d97a6a3ab20926d7c3f891f14e119eb882c6e8d3deb07e1b79eed089"
-SOURCE: SourceInfo = {
+METADATA: SourceInfo = {
     "N": 10,
     "checksum": CHECKSUM,
     "checksum_file": "sha256sums.txt",
     "path": DATA,
 }
 
+CONDITION_UPSET = pd.DataFrame(
+    {
+        "diabetes": [False] * 8 + [True, False],
+        "headache": [True, False, True, False, False, False, True, False, True, True],
+    },
+    index=pd.Index(
+        [
+            "Patient/0f0836fe-8e72-4e2b-8869-2807b3599beb",
+            "Patient/4308f3e1-76e9-47ee-920e-a06fb472b9cc",
+            "Patient/540f5e28-6fc6-4625-9c4a-f66a0fefb7aa",
+            "Patient/6e86a167-c523-48bc-8af0-8b7d004cfc01",
+            "Patient/6f3681fb-dd4f-49a7-9d1a-ccb8fb7940f1",
+            "Patient/7ef87588-55c7-4f48-bbf2-896e1a837454",
+            "Patient/9a5be5ad-637a-44cb-a525-80abd55e9961",
+            "Patient/9ded1a45-69b7-4200-9d4d-34f9996cbea6",
+            "Patient/b4a9a271-2bc0-42b9-ab7f-f99c7a66b983",
+            "Patient/cfd5ad0f-cace-4ecd-891d-2b4ab8a10245",
+        ],
+        name="subject",
+        dtype="string[pyarrow]",
+    ),
+).rename_axis(columns="condition")
+CONDITION_PROPORTION = pd.DataFrame(
+    {"condition": ["diabetes", "headache"], "proportion": [1.0, 0.5]}
+)
+AGE_PYRAMID = pd.DataFrame(
+    {
+        "gender": ["female"] * 4 + ["male"] * 6,
+        "age_group": [
+            "16 - 20",
+            "41 - 45",
+            "46 - 50",
+            "81 - 85",
+            "1 - 5",
+            "6 - 10",
+            "31 - 35",
+            "56 - 60",
+            "86 - 90",
+            "96 - 100",
+        ],
+        "outcome": ["censored", "alive", "discharged"] + ["alive"] * 7,
+        "count": [1] * 10,
+    }
+)
+
 
 def test_read_metadata():
-    assert read_metadata(DATA / "fhirflat.toml") == SOURCE
+    assert read_metadata(DATA / "fhirflat.toml") == METADATA
 
 
 def test_use_source():
-    assert use_source(DATA, CHECKSUM) == SOURCE
+    parts = {name: DATA / f"{name}.parquet" for name in ["condition", "encounter", "patient"]}
+    source = use_source(DATA, CHECKSUM)
+    datasets = source.pop("datasets")
+    assert source == {**METADATA, "parts": parts}
+    assert {name: dataset.files for name, dataset in datasets.items()} == {
+        name: [str(file)] for name, file in parts.items()
+    }
 
 
-def test_list_parts():
-    assert list_parts(SOURCE) == ["condition", "encounter", "patient"]
+def test_list_parts(source):
+    assert list_parts(source) == ["condition", "encounter", "patient"]
 
 
 def test_use_source_filenotfound():
@@ -49,65 +111,119 @@ def test_use_source_incorrect_checksum():
         assert use_source(DATA, "")
 
 
-def test_part_file():
-    source = use_source(DATA, CHECKSUM)
+def test_use_source_corrupt_part(tmp_path):
+    shutil.copytree(DATA, tmp_path, dirs_exist_ok=True)
+    with (tmp_path / "patient.parquet").open("ab") as fp:
+        fp.write(b"corrupt")
+    with pytest.raises(ValueError, match="failed checksum validation for patient.parquet"):
+        use_source(tmp_path, CHECKSUM)
+
+
+def test_use_source_missing_part(tmp_path):
+    shutil.copytree(DATA, tmp_path, dirs_exist_ok=True)
+    (tmp_path / "condition.parquet").unlink()
+    with pytest.raises(ValueError, match="failed checksum validation for condition.parquet"):
+        use_source(tmp_path, CHECKSUM)
+
+
+def test_use_source_unlisted_part(tmp_path):
+    shutil.copytree(DATA, tmp_path, dirs_exist_ok=True)
+    shutil.copy(DATA / "patient.parquet", tmp_path / "extra.parquet")
+    source = use_source(tmp_path, CHECKSUM)
+    assert list_parts(source) == ["condition", "encounter", "patient"]
+    assert "extra" not in source["datasets"]
+    with pytest.raises(FileNotFoundError):
+        read_part(source, "extra")
+
+
+def test_part_file(source):
     assert part_file(source, "patient") == DATA / "patient.parquet"
 
 
-def test_part_file_missing():
-    source = use_source(DATA, CHECKSUM)
+def test_part_file_unindexed():
+    assert list_parts(METADATA) == ["condition", "encounter", "patient"]
+    assert part_file(METADATA, "patient") == DATA / "patient.parquet"
+    with pytest.raises(FileNotFoundError):
+        part_file(METADATA, "immunization")
+
+
+def test_part_file_missing(source):
     with pytest.raises(FileNotFoundError):
         part_file(source, "immunization")
 
 
-def test_read_part():
-    read_part(SOURCE, "patient")
-
-
-def test_condition_upset():
-    df = condition_upset(SOURCE)["data"]
-    assert (
-        df.to_csv()
-        == """subject,diabetes,headache
-Patient/0f0836fe-8e72-4e2b-8869-2807b3599beb,False,True
-Patient/4308f3e1-76e9-47ee-920e-a06fb472b9cc,False,False
-Patient/540f5e28-6fc6-4625-9c4a-f66a0fefb7aa,False,True
-Patient/6e86a167-c523-48bc-8af0-8b7d004cfc01,False,False
-Patient/6f3681fb-dd4f-49a7-9d1a-ccb8fb7940f1,False,False
-Patient/7ef87588-55c7-4f48-bbf2-896e1a837454,False,False
-Patient/9a5be5ad-637a-44cb-a525-80abd55e9961,False,True
-Patient/9ded1a45-69b7-4200-9d4d-34f9996cbea6,False,False
-Patient/b4a9a271-2bc0-42b9-ab7f-f99c7a66b983,True,True
-Patient/cfd5ad0f-cace-4ecd-891d-2b4ab8a10245,False,True
-"""
-    )
+def test_read_part(source):
+    # reads through the dataset opened by use_source() and from the file
+    assert read_part(source, "patient").equals(read_part(METADATA, "patient"))
 
 
-def test_condition_proportion():
-    df = condition_proportion(SOURCE)["data"]
-    assert (
-        df.to_csv(index=False)
-        == """condition,proportion
-diabetes,1.0
-headache,0.5
-"""
+def test_read_condition_cached(source):
+    condition = read_condition(source)
+    condition["condition"] = "overwritten"
+    assert "overwritten" not in set(read_condition(source).condition)
+
+
+def test_read_condition_cache_bounded(source, taxonomy, monkeypatch):
+    monkeypatch.setattr(_CONDITION_CACHE, "maxsize", 1)
+    read_condition.cache_clear()
+    read_condition(source, dict(taxonomy))
+    # a different taxonomy object evicts the first entry
+    read_condition(source, dict(taxonomy))
+    assert len(_CONDITION_CACHE) == 1
+    read_condition.cache_clear()
+    assert not _CONDITION_CACHE
+
+
+def test_read_parts_parallel(source, monkeypatch):
+    parts = [("patient", {"id": "subject"}, None), ("encounter", None, None)]
+    sequential = read_parts(source, *parts)
+    monkeypatch.setenv("POLYFLAME_PARALLEL_IO", "1")
+    for df, expected in zip(read_parts(source, *parts), sequential):
+        assert df.equals(expected)
+
+
+def test_condition_upset(source):
+    df = condition_upset(source)["data"]
+    pd.testing.assert_frame_equal(
+        df, CONDITION_UPSET, check_column_type=False, check_categorical=False
     )
 
 
-def test_age_pyramid():
-    df = age_pyramid(SOURCE)["data"]
-    assert (
-        df.to_csv(index=False)
-        == """gender,age_group,outcome,count
-female,16 - 20,censored,1
-female,41 - 45,alive,1
-female,46 - 50,discharged,1
-female,81 - 85,alive,1
-male,1 - 5,alive,1
-male,6 - 10,alive,1
-male,31 - 35,alive,1
-male,56 - 60,alive,1
-male,86 - 90,alive,1
-male,96 - 100,alive,1
-"""
+def test_condition_proportion(source):
+    df = condition_proportion(source)["data"]
+    pd.testing.assert_frame_equal(
+        df, CONDITION_PROPORTION, check_dtype=False, check_categorical=False
     )
+
+
+def test_age_pyramid(source):
+    df = age_pyramid(source)["data"]
+    pd.testing.assert_frame_equal(df, AGE_PYRAMID, check_dtype=False, check_categorical=False)
+
+
+def test_age_groups_uniform_bins():
+    age = pd.Series([-2, -1, -0.5, 0, 0.5, 1, 5, 5.5, 119, 120, 121, np.nan])
+    expected = pd.cut(age, bins=DEFAULT_AGE_BINS, labels=DEFAULT_AGE_GROUP_LABELS)
+    actual = age_groups(age, DEFAULT_AGE_BINS, DEFAULT_AGE_GROUP_LABELS)
+    assert isinstance(actual, pd.Categorical)
+    assert actual.equals(pd.Categorical(expected))
+
+
+def test_age_groups_numba(monkeypatch):
+    pytest.importorskip("numba")
+    age = pd.Series(np.random.default_rng(0).integers(-5, 130, 1000))
+    # bins of differing widths, uniform bins are assigned arithmetically
+    bins = [-1, 0, 17, 64, 120]
+    labels = age_group_labels(bins)
+    expected = age_groups(age, bins, labels)
+    monkeypatch.setattr("polyflame.fhirflat.NUMBA_MIN_ROWS", 0)
+    actual = age_groups(age, bins, labels)
+    assert isinstance(actual, pd.Categorical)
+    assert actual.equals(pd.Categorical(expected))
+
+
+def test_age_groups_numba_invalid_bins(monkeypatch):
+    pytest.importorskip("numba")
+    monkeypatch.setattr("polyflame.fhirflat.NUMBA_MIN_ROWS", 0)
+    with pytest.raises(ValueError, match="bins must increase monotonically"):
+        age_groups(pd.Series([1.0, 7.0]), [0, 10, 5], ["a", "b"])
@@ -2,16 +2,18 @@
 Tests for polyflame.plots
 """
 
-from collections import OrderedDict
-
 import pandas as pd
 import pytest
 
 from polyflame.plots import (
     ax,
+    cumulative_bar,
     get_colors,
     require_columns,
     lighten,
+    lighten_many,
+    proportion,
+    upset,
     _compute_intersections,
 )
 
@@ -40,16 +42,65 @@ def test_lighten():
     assert lighten("#000000") == "#999999"
 
 
+def test_lighten_many():
+    assert lighten_many(["#000000", "#007aec", "#ffffff"]) == ["#999999", "#91caff", "#ffffff"]
+
+
 def test_compute_intersections():
     df = pd.DataFrame({"headache": [1, 1, 0], "diabetes": [0, 1, 0], "hypertension": [0, 1, 1]})
-    assert _compute_intersections(df) == OrderedDict(
-        {
-            ("headache",): 2,
-            ("hypertension",): 2,
-            ("diabetes",): 1,
-            ("headache", "diabetes"): 1,
-            ("headache", "hypertension"): 1,
-            ("diabetes", "hypertension"): 1,
-            ("headache", "diabetes", "hypertension"): 1,
-        }
+    # dict equality ignores order, so compare items to check the ordering too
+    assert list(_compute_intersections(df).items()) == [
+        (("headache",), 2),
+        (("hypertension",), 2),
+        (("diabetes",), 1),
+        (("headache", "diabetes"), 1),
+        (("headache", "hypertension"), 1),
+        (("diabetes", "hypertension"), 1),
+        (("headache", "diabetes", "hypertension"), 1),
+    ]
+
+
+def test_compute_intersections_cached():
+    df = pd.DataFrame({"headache": [1, 1, 0], "diabetes": [0, 1, 0]})
+    first = _compute_intersections(df)
+    first[("headache",)] = 0
+    assert _compute_intersections(df)[("headache",)] == 2
+    df.loc[2, "headache"] = 1
+    assert _compute_intersections(df)[("headache",)] == 3
+
+
+def test_upset_traces():
+    df = pd.DataFrame({"headache": [1, 1, 0], "diabetes": [0, 1, 0], "hypertension": [0, 1, 1]})
+    bars, points, lines = upset(df).data
+    assert list(bars.y) == [2, 2, 1, 1, 1, 1, 1]
+    assert len(points.x) == 12
+    assert list(lines.y) == [-1, -2, None, -1, -3, None, -2, -3, None, -1, -3, None]
+
+
+def test_proportion_traces():
+    df = pd.DataFrame({"label": ["fever", "cough", "fever"], "proportion": [0.2, 0.5, 0.4]})
+    yes, no = proportion(df).data
+    assert list(yes.y) == list(no.y) == ["fever", "cough"]
+    assert list(yes.x) == pytest.approx([0.3, 0.5])
+    assert list(no.x) == pytest.approx([0.7, 0.5])
+
+
+def test_cumulative_bar():
+    df = pd.DataFrame(
+        {"timepoint": [3, 1, 1, 4], "stack_group": ["a", "a", "b", "b"], "value": [2, 1, 5, 1]}
     )
+    a, b = cumulative_bar(df).data
+    assert list(a.x) == list(b.x) == [1, 3, 4]
+    assert list(a.y) == [1, 3, 5]
+    assert list(b.y) == [5, 10, 11]
+
+
+def test_proportion_aggregated():
+    df = pd.DataFrame({"label": ["fever", "cough", "ache"], "proportion": [0.3, 0.5, 0.3]})
+    yes, _ = proportion(df).data
+    assert list(yes.y) == ["ache", "fever", "cough"]
+    assert list(yes.x) == pytest.approx([0.3, 0.3, 0.5])
+    df = pd.DataFrame({"label": ["fever", None, "cough"], "proportion": [0.3, 0.9, 0.5]})
+    yes, _ = proportion(df).data
+    assert list(yes.y) == ["fever", "cough"]
+    assert list(yes.x) == pytest.approx([0.3, 0.5])
@@ -2,27 +2,72 @@
 Tests for polyflame.util
 """
 
+import hashlib
+import os
 from pathlib import Path
 
 import pytest
 
-from polyflame.types import SourceInfo
-from polyflame.util import get_checksum, load_taxonomy, msg_part_not_found
+from polyflame.util import (
+    LRUCache,
+    get_checksum,
+    load_taxonomy,
+    msg_part_not_found,
+    read_checksums,
+)
 from polyflame.fhirflat import read_part, with_readable_terms
 
 DATA = Path("polyflame/samples/sample-fhirflat")
-TAXONOMY = load_taxonomy("fhirflat-isaric3")
 CHECKSUM = "03cc8e28d97a6a3ab20926d7c3f891f14e119eb882c6e8d3deb07e1b79eed089"
-SOURCE: SourceInfo = {
-    "N": 10,
-    "checksum": CHECKSUM,
-    "checksum_file": "sha256sums.txt",
-    "path": DATA,
-}
 
 
 def test_get_checksum():
-    assert get_checksum("polyflame/samples/sample-fhirflat/sha256sums.txt") == CHECKSUM
+    assert get_checksum(DATA / "sha256sums.txt") == CHECKSUM
+
+
+def test_get_checksum_changed_file(tmp_path):
+    file = tmp_path / "data.txt"
+    file.write_text("polyflame")
+    assert get_checksum(file) == hashlib.sha256(b"polyflame").hexdigest()
+    file.write_text("polyflame, changed")
+    assert get_checksum(file) == hashlib.sha256(b"polyflame, changed").hexdigest()
+
+
+def test_get_checksum_large_file(tmp_path):
+    file = tmp_path / "data.bin"
+    data = bytes(range(256)) * 1024  # 256 KiB, hashed through mmap
+    file.write_bytes(data)
+    assert get_checksum(file) == hashlib.sha256(data).hexdigest()
+
+
+def test_get_checksum_cache_clear(tmp_path):
+    file = tmp_path / "data.txt"
+    file.write_text("polyflame")
+    st = file.stat()
+    assert get_checksum(file) == hashlib.sha256(b"polyflame").hexdigest()
+    # same size and modification time, so the cached checksum is returned
+    file.write_text("PolyFLAME")
+    os.utime(file, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert get_checksum(file) == hashlib.sha256(b"polyflame").hexdigest()
+    get_checksum.cache_clear()
+    assert get_checksum(file) == hashlib.sha256(b"PolyFLAME").hexdigest()
+
+
+def test_read_checksums(tmp_path):
+    file = tmp_path / "sha256sums.txt"
+    file.write_text("ABC123  patient.parquet\n\ndef456 *encounter.parquet\n")
+    assert read_checksums(file) == {"patient.parquet": "abc123", "encounter.parquet": "def456"}
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    cache.clear()
+    assert len(cache) == 0
 
 
 def test_load_taxonomy():
@@ -34,17 +79,17 @@ def test_load_taxonomy_error():
         load_taxonomy("notfound")
 
 
-def test_msg_part_not_found():
+def test_msg_part_not_found(source):
     assert (
-        msg_part_not_found(SOURCE, "immunization")
+        msg_part_not_found(source, "immunization")
         == "Data at path=polyflame/samples/sample-fhirflat missing part=immunization"
     )
 
 
-def test_with_readable_terms():
+def test_with_readable_terms(source, taxonomy):
     patient = with_readable_terms(
         read_part(
-            SOURCE,
+            source,
             "patient",
             {
                 "extension.birthSex.code": "gender",
@@ -53,10 +98,11 @@ def test_with_readable_terms():
                 "id": "subject",
             },
         ),
-        TAXONOMY,
+        taxonomy,
         [{"term_column": "gender"}],
     )
     # check gender mapped correctly from SNOMED cod
     assert list(patient.gender.unique()) == ["female", "male"]
     # check column renames
     assert set(patient.columns) == {"gender", "age", "age_unit", "subject"}
+